@@ -0,0 +1,112 @@
+"""
+批量删除（plan_delete / execute_delete）的往返测试：筛选条件、暂存目录和空目录清理。
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+文件处理器 = pytest.importorskip("文件处理器")  # 依赖 PyQt5、dirsync 等，未安装时跳过
+
+
+def make_tree(root, files):
+    """
+    按 {相对路径: 内容} 创建文件，返回根目录。
+    """
+    for relative_path, data in files.items():
+        path = os.path.join(root, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+    return root
+
+
+def planned_paths(plan, root):
+    tree = plan["tree"]
+    return sorted(os.path.relpath(tree.path(index), root).replace(os.sep, "/") for index in plan["files"])
+
+
+def remaining_files(root):
+    return sorted(
+        os.path.relpath(os.path.join(current, name), root).replace(os.sep, "/")
+        for current, _, names in os.walk(root) for name in names
+    )
+
+
+def test_plan_delete_filters(tmp_path):
+    root = make_tree(str(tmp_path), {
+        "a.log": b"x" * 10,
+        "b.tmp": b"x" * 5000,
+        "keep.txt": b"x",
+        "sub/c.LOG": b"x" * 3000,
+        "sub/cache_1": b"x",
+        "sub/photo.png": b"x" * 100,
+    })
+    old = time.time() - 10 * 86400
+    os.utime(os.path.join(root, "a.log"), (old, old))
+
+    plan = 文件处理器.plan_delete(root, extensions=[".log", ".tmp"])
+    assert planned_paths(plan, root) == ["a.log", "b.tmp", "sub/c.LOG"]
+    assert plan["bytes"] == 8010
+
+    assert planned_paths(文件处理器.plan_delete(root, patterns=["cache_*"]), root) == ["sub/cache_1"]
+    assert planned_paths(文件处理器.plan_delete(root, older_than_days=5), root) == ["a.log"]
+    assert planned_paths(文件处理器.plan_delete(root, min_size=2048, max_size=4096), root) == ["sub/c.LOG"]
+    assert planned_paths(文件处理器.plan_delete(root, categories=["图像"]), root) == ["sub/photo.png"]
+    # 不同类条件需同时满足
+    assert planned_paths(文件处理器.plan_delete(root, extensions=[".log"], min_size=1024), root) == ["sub/c.LOG"]
+    assert planned_paths(文件处理器.plan_delete(root, extensions=[".log"], exclude_dir=os.path.join(root, "sub")),
+                         root) == ["a.log"]
+
+
+def test_execute_delete_removes_files(tmp_path):
+    root = make_tree(str(tmp_path), {"a.tmp": b"12", "sub/b.tmp": b"345", "sub/keep.txt": b"6"})
+
+    plan = 文件处理器.plan_delete(root, extensions=[".tmp"])
+    result = 文件处理器.execute_delete(plan, root, batch_size=1)
+
+    assert (result["files"], result["bytes"], result["errors"]) == (2, 5, [])
+    assert remaining_files(root) == ["sub/keep.txt"]
+
+
+def test_staging_keeps_every_purged_copy(tmp_path):
+    root = str(tmp_path / "root")
+    staging_dir = os.path.join(root, ".删除暂存")
+    for content in (b"first", b"second"):
+        make_tree(root, {"z/one.tmp": content})
+        plan = 文件处理器.plan_delete(root, extensions=[".tmp"], exclude_dir=staging_dir)
+        result = 文件处理器.execute_delete(plan, root, staging_dir=staging_dir)
+        assert result["files"] == 1
+        assert os.path.dirname(result["staging_dir"]) == staging_dir
+
+    staged = {}
+    for relative_path in remaining_files(staging_dir):
+        with open(os.path.join(staging_dir, *relative_path.split("/")), "rb") as file:
+            staged[relative_path] = file.read()
+    assert sorted(staged.values()) == [b"first", b"second"]
+    assert all(path.endswith("/z/one.tmp") for path in staged)
+    assert not os.path.exists(os.path.join(root, "z", "one.tmp"))
+
+
+def test_remove_only_directories_emptied_by_purge(tmp_path):
+    root = make_tree(str(tmp_path), {
+        "a/b/c/x.tmp": b"x",
+        "a/keep.txt": b"k",
+        "d/e/y.tmp": b"y",
+    })
+    os.makedirs(os.path.join(root, "empty_before"))
+    os.makedirs(os.path.join(root, "d", "empty_sibling"))
+
+    plan = 文件处理器.plan_delete(root, extensions=[".tmp"])
+    result = 文件处理器.execute_delete(plan, root, remove_empty_dirs=True)
+
+    assert result["files"] == 2
+    assert result["dirs"] == 3  # a/b/c、a/b、d/e
+    assert not os.path.exists(os.path.join(root, "a", "b"))
+    assert not os.path.exists(os.path.join(root, "d", "e"))
+    assert os.path.isdir(os.path.join(root, "a"))  # 仍有 keep.txt
+    assert os.path.isdir(os.path.join(root, "d", "empty_sibling"))  # 原本为空，不属于本次清理
+    assert os.path.isdir(os.path.join(root, "empty_before"))
+    assert os.path.isdir(root)
@@ -1,20 +1,36 @@
 import json
 import sys
 import os
-from contextlib import redirect_stdout
-from io import StringIO
+import re
+import bisect
+from array import array
+import fnmatch
+import heapq
+import lzma
+import shutil
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from io import BytesIO
+import cProfile
 import logging
+import queue
+import threading
+import tracemalloc
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from tkinter import dialog
 
-import dirsync
 from dirsync import sync as dirsync_sync
+from dirsync.syncer import Syncer
 import pandas as pd
 import requests
 import socket
 import mimetypes
 from datetime import datetime
 import subprocess
-from PyQt5.QtCore import Qt
+import time
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QColor, QTextCharFormat, QTextCursor, QIcon
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -22,6 +38,178 @@ from PyQt5.QtWidgets import (
     QDialogButtonBox, QComboBox, QMessageBox, QCheckBox, QInputDialog, QRadioButton
 )
 
+try:
+    import numpy as np  # 可选依赖，用于紧凑目录树的向量化筛选
+except ImportError:
+    np = None
+
+try:
+    import zstandard  # 可选依赖，未安装时归档备份回退到 xz 压缩
+except ImportError:
+    zstandard = None
+
+ARCHIVE_CHUNK_SIZE = 4 * 1024 * 1024  # 归档备份每个独立压缩块的原始大小
+BACKUP_LOG_FILE = "备份文件日志.txt"  # 备份日志保存路径（相对工作目录）
+METRICS_DIR = "运行报告"  # 运行指标报告保存目录（相对工作目录）
+CONTENT_TYPE_CACHE_FILE = "文件类型缓存.json"  # 内容识别结果缓存（相对工作目录）
+
+backup_logger = logging.getLogger("file_processor.backup")
+
+FILE_CATEGORIES = ("图像", "文本", "压缩", "可执行", "音频", "视频", "其他")
+CATEGORY_CODES = {category: code for code, category in enumerate(FILE_CATEGORIES)}  # 紧凑存储中的类别编码
+
+CATEGORY_COLORS = {
+    "图像": "magenta",  # 品红色图像文件
+    "文本": "Slate Grey",  # 石板灰色文本文件
+    "压缩": "red",  # 红色压缩文件
+    "可执行": "green",  # 绿色可执行文件
+    "音频": "Pink",  # 粉色音频文件
+    "视频": "Orange",  # 橙色视频文件
+    "其他": "Charcoal Black",  # 碳黑其他文件
+}
+
+
+def classify_file(name):
+    """
+    根据文件名判断文件类别，返回 FILE_CATEGORIES 中的一项。
+    """
+    # 获取文件的 MIME 类型
+    mime_type, _ = mimetypes.guess_type(name)
+    ext = os.path.splitext(name)[1].lower()
+
+    if mime_type and mime_type.startswith("image"):
+        return "图像"
+    elif mime_type and mime_type.startswith("text")or ext in [".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".odt", ".ods", ".odp", ".odg", ".odf", ".rtf", ".tex", ".md", ".txt", ".log", ".ini", ".conf", ".cfg", ".yaml", ".yml",".json", ".xml", ".csv", ".tsv", ".xls",".eml"]:
+        return "文本"
+    elif mime_type and mime_type.startswith("application/zip") or ext in [
+        ".zip", ".rar", ".7z", ".tar", ".gz", ".bz2", ".xz", ".iso", ".dmg", ".img", ".iso", ".arj", ".vdi", ".vhd", ".zipx", ".ace", ".cab", ".lz", ".lzma", ".tar.bz2", ".tar.gz", ".tar.lzma", ".tar.xz", ".tar.zst", ".tar.z", ".tar.Z",]:
+        return "压缩"
+    elif ext in [".exe", ".bat", ".cmd", ".msi", ".sh", ".py", ".js", ".html", ".css", ".php", ".java", ".cpp", ".c", ".h", ".go", ".rb", ".pl", ".jar", ".ps1", ".vbs", ".vb", ".dmg", ".ts", ".tsx", ".app", ".pyw", ".pyi", ".pyc", ".pyo", ".pyd", ".pyz", ".ap", ".apk"]:
+        return "可执行"
+    elif ext in [".mp3",".wav",".flac",".aac",".alac",".m4a",".amr",".ogg",".ape",".wma",".opus",".midi"]:
+        return "音频"
+    elif ext in [".mp4", ".avi", ".mov", ".wmv", ".mkv", ".flv", ".webm", ".ogg", ".ogv", ".ogm", ".m4v", ".mpg", ".mpeg", ".m2v", ".mts", ".m2ts", ".ts", ".3gp", ".3g2", ".m3u8", ".m3u", ".m3u8", ]:
+        return "视频"
+    else:
+        return "其他"
+
+
+# 文件头特征：(偏移, 特征字节, 类别)，按顺序匹配，只需读取文件开头 SNIFF_SIZE 字节
+MAGIC_SIGNATURES = [
+    (0, b"\x89PNG\r\n\x1a\n", "图像"),
+    (0, b"\xff\xd8\xff", "图像"),
+    (0, b"GIF87a", "图像"),
+    (0, b"GIF89a", "图像"),
+    (0, b"II*\x00", "图像"),
+    (0, b"MM\x00*", "图像"),
+    (0, b"%PDF", "文本"),
+    (0, b"{\\rtf", "文本"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "文本"),  # doc/xls/ppt 等旧版 Office 文档
+    (0, b"Rar!\x1a\x07", "压缩"),
+    (0, b"7z\xbc\xaf\x27\x1c", "压缩"),
+    (0, b"\x1f\x8b", "压缩"),
+    (0, b"BZh", "压缩"),
+    (0, b"\xfd7zXZ\x00", "压缩"),
+    (0, b"\x28\xb5\x2f\xfd", "压缩"),
+    (0, b"MSCF", "压缩"),
+    (257, b"ustar", "压缩"),
+    (0, b"MZ", "可执行"),
+    (0, b"\x7fELF", "可执行"),
+    (0, b"\xfe\xed\xfa\xce", "可执行"),
+    (0, b"\xfe\xed\xfa\xcf", "可执行"),
+    (0, b"\xce\xfa\xed\xfe", "可执行"),
+    (0, b"\xcf\xfa\xed\xfe", "可执行"),
+    (0, b"\xca\xfe\xba\xbe", "可执行"),
+    (0, b"#!", "可执行"),
+    (0, b"ID3", "音频"),
+    (0, b"\xff\xfb", "音频"),
+    (0, b"\xff\xf3", "音频"),
+    (0, b"fLaC", "音频"),
+    (0, b"OggS", "音频"),
+    (0, b"MThd", "音频"),
+    (0, b"#!AMR", "音频"),
+    (4, b"ftypM4A", "音频"),
+    # HEIF/HEIC/AVIF 图片（如 iPhone 照片）同样使用 ftyp 盒子，需按品牌在通用的 ftyp 视频之前识别
+    (4, b"ftypheic", "图像"),
+    (4, b"ftypheix", "图像"),
+    (4, b"ftypheim", "图像"),
+    (4, b"ftypheis", "图像"),
+    (4, b"ftyphevc", "图像"),
+    (4, b"ftyphevx", "图像"),
+    (4, b"ftypmif1", "图像"),
+    (4, b"ftypmsf1", "图像"),
+    (4, b"ftypavif", "图像"),
+    (4, b"ftypavis", "图像"),
+    (4, b"ftypcrx ", "图像"),  # 佳能 CR3 原始图像
+    (4, b"ftyp", "视频"),
+    (0, b"\x1a\x45\xdf\xa3", "视频"),
+    (0, b"FLV", "视频"),
+    (0, b"\x00\x00\x01\xba", "视频"),
+    (0, b"\x00\x00\x01\xb3", "视频"),
+]
+
+# RIFF 容器需要看第 8 字节开始的格式标识
+RIFF_FORMATS = {b"WEBP": "图像", b"WAVE": "音频", b"AVI ": "视频"}
+
+SNIFF_SIZE = 512  # 内容识别读取的文件头字节数
+
+
+def zip_entry_names(head):
+    """
+    依次解析文件头中的 zip 本地文件头，返回条目名称列表（最后一个名称可能在文件头末尾被截断）。
+    条目使用数据描述符（大小写在数据之后）时无法定位下一个条目，在此停止。
+    """
+    names = []
+    offset = 0
+    while head[offset:offset + 4] == b"PK\x03\x04" and offset + 30 <= len(head):
+        flags = int.from_bytes(head[offset + 6:offset + 8], "little")
+        compressed_size = int.from_bytes(head[offset + 18:offset + 22], "little")
+        name_length = int.from_bytes(head[offset + 26:offset + 28], "little")
+        extra_length = int.from_bytes(head[offset + 28:offset + 30], "little")
+        names.append(head[offset + 30:offset + 30 + name_length])
+        if flags & 0x08:
+            break
+        offset += 30 + name_length + extra_length + compressed_size
+    return names
+
+
+def sniff_category(head, name=""):
+    """
+    根据文件头字节判断文件类别，无法识别时退回到按文件名判断。
+    :param head: 文件开头的若干字节
+    :param name: 文件名，用于无法识别时的判断
+    """
+    if head.startswith(b"RIFF") and head[8:12] in RIFF_FORMATS:
+        return RIFF_FORMATS[head[8:12]]
+
+    if head.startswith(b"PK\x03\x04"):
+        # zip 容器（Office 文档、jar/apk 安装包等）：文件名能判断类别时以文件名为准，
+        # 否则根据文件头中能看到的条目名称区分 Office 文档、安装包和普通压缩包
+        category = classify_file(name)
+        if category != "其他":
+            return category
+        for entry_name in zip_entry_names(head):
+            if entry_name in (b"[Content_Types].xml", b"mimetype") or entry_name.startswith((b"word/", b"xl/", b"ppt/")):
+                return "文本"
+            if entry_name.startswith(b"META-INF/") or entry_name == b"AndroidManifest.xml":
+                return "可执行"
+        return "压缩"
+
+    for offset, signature, category in MAGIC_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return category
+
+    category = classify_file(name)
+    if category == "其他" and head and b"\x00" not in head:
+        # 没有已知特征且不含空字节，尝试按 UTF-8 文本识别（读满 SNIFF_SIZE 时允许末尾截断半个字符）
+        try:
+            head.decode("utf-8")
+            return "文本"
+        except UnicodeDecodeError as e:
+            if len(head) == SNIFF_SIZE and e.reason == "unexpected end of data":
+                return "文本"
+    return category
+
 
 def is_connected():
     """
@@ -35,6 +223,1206 @@ def is_connected():
         return False
 
 
+class GuiLogSink(logging.Handler):
+    """
+    日志框输出端：把日志行和颜色放入有界缓冲，由界面线程定时批量取出。
+    缓冲满时丢弃最旧的行并计数，保证长时间同步时内存有界。
+    """
+
+    LEVEL_COLORS = {logging.ERROR: "red", logging.WARNING: "orange"}
+
+    def __init__(self, capacity=10000):
+        super().__init__()
+        self.lines = deque(maxlen=capacity)
+        self.dropped = 0
+
+    def emit(self, record):
+        color = getattr(record, "color", None) or self.LEVEL_COLORS.get(record.levelno, "blue")
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        self.lines.append((self.format(record), color))
+
+    def drain(self, batch_size=500):
+        lines = []
+        while self.lines and len(lines) < batch_size:
+            lines.append(self.lines.popleft())
+        return lines
+
+    def take_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class BlockingQueueHandler(QueueHandler):
+    """
+    队列满时阻塞等待而不是丢弃日志，由日志线程对产生日志的后台任务施加背压。
+    """
+
+    def enqueue(self, record):
+        self.queue.put(record)
+
+
+class LogPipeline:
+    """
+    异步日志管道：日志器只把记录放入有界队列，由 QueueListener 后台线程
+    写入按大小滚动的 UTF-8 日志文件，并转发到日志框输出端。
+    """
+
+    def __init__(self, log_file, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = BlockingQueueHandler(self.queue)
+
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        self.gui_sink = GuiLogSink()
+        self.listener = QueueListener(self.queue, file_handler, self.gui_sink, respect_handler_level=True)
+        self.file_handler = file_handler
+
+    def attach(self, *logger_names):
+        for name in logger_names:
+            logger = logging.getLogger(name)
+            logger.addHandler(self.handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    def start(self):
+        self.listener.start()
+
+    def stop(self):
+        self.listener.stop()
+        self.file_handler.close()
+
+
+class ContentTypeCache:
+    """
+    内容识别结果缓存，以 (设备号, inode, 大小, 修改时间, 按文件名判断的类别) 为键保存到本地 JSON 文件，
+    文件未变化时无需再次读取；识别结果会退回到按文件名判断，因此改名后类别变化时缓存失效。
+    超过容量时丢弃最早加入的记录。
+    """
+
+    def __init__(self, path, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    @staticmethod
+    def key(stat, name):
+        return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}:{classify_file(name)}"
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, category):
+        with self.lock:
+            self.entries[key] = category
+            self.dirty = True
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(self.entries, file, ensure_ascii=False)
+            os.replace(self.path + ".tmp", self.path)
+            self.dirty = False
+
+
+class ContentClassifier:
+    """
+    按文件内容识别类别：在线程池中并行读取文件头，结果写入 ContentTypeCache。
+    使用完毕后调用 close() 关闭线程池。
+    """
+
+    def __init__(self, cache, workers=8):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.hits = 0  # 命中缓存的文件数
+        self.misses = 0  # 实际读取文件头的文件数
+
+    def classify(self, path):
+        name = os.path.basename(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return classify_file(name)
+
+        key = ContentTypeCache.key(stat, name)
+        category = self.cache.get(key)
+        if category is not None:
+            with self.lock:
+                self.hits += 1
+            return category
+
+        with self.lock:
+            self.misses += 1
+        try:
+            with open(path, "rb") as file:
+                head = file.read(SNIFF_SIZE)
+        except OSError:
+            return classify_file(name)
+        category = sniff_category(head, name)
+        self.cache.set(key, category)
+        return category
+
+    def classify_many(self, paths):
+        """
+        并行识别一批文件，按输入顺序返回类别列表。
+        """
+        if len(paths) <= 1:
+            return [self.classify(path) for path in paths]
+        return list(self.executor.map(self.classify, paths))
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def peak_rss_bytes():
+    """
+    返回当前进程的内存占用峰值（字节），无法获取时返回 None。
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux 下单位为 KB
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows 下没有 resource 模块，可选使用 psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss)
+    except ImportError:
+        return None
+
+
+class OperationMetrics:
+    """
+    单次操作的运行指标：文件数、字节数、各阶段墙钟/CPU 耗时、系统调用计数和内存峰值。
+    后台任务累加计数，界面线程通过 summary() 读取；可选开启 cProfile/tracemalloc 性能分析。
+    阶段的 CPU 时间为整个进程在该阶段内消耗的 CPU 时间（包含压缩、删除等工作线程）。
+    """
+
+    def __init__(self, operation, profile=False):
+        self.operation = operation
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.files = 0
+        self.bytes = 0
+        self.phases = {}  # 阶段名称 -> {'wall': 秒, 'cpu': 秒, 'count': 次数}
+        self.syscalls = {}  # 系统调用名称 -> 次数
+        self.current_phase = None
+        self.lock = threading.Lock()
+
+        # Python 3.12 之前 cProfile 只分析开启它的线程，因此应在执行操作的线程中创建本对象；
+        # 3.12 起基于 sys.monitoring 对整个进程生效，同一时间只能开启一个，已被占用时抛出 ValueError
+        self.profiler = None
+        self.tracemalloc_started = False
+        if profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracemalloc_started = True
+
+    @contextmanager
+    def phase(self, name):
+        """
+        统计一个阶段的耗时，同名阶段多次进入时累加。
+        """
+        previous_phase = self.current_phase
+        self.current_phase = name
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield self
+        finally:
+            self.add_phase(name, time.perf_counter() - start_wall, time.process_time() - start_cpu)
+            self.current_phase = previous_phase
+
+    def add_phase(self, name, wall, cpu):
+        """
+        累加一次阶段耗时，用于无法用 phase() 包裹的代码（例如第三方库的回调）。
+        """
+        with self.lock:
+            stats = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0, "count": 0})
+            stats["wall"] += wall
+            stats["cpu"] += cpu
+            stats["count"] += 1
+
+    def add(self, files=0, bytes=0):
+        with self.lock:
+            self.files += files
+            self.bytes += bytes
+
+    def count(self, syscall, n=1):
+        with self.lock:
+            self.syscalls[syscall] = self.syscalls.get(syscall, 0) + n
+
+    def elapsed(self):
+        return self.wall if self.finished_at else time.perf_counter() - self.start_wall
+
+    def summary(self):
+        """
+        返回用于状态栏显示的一行摘要。
+        """
+        elapsed = self.elapsed() or 1e-9
+        phase = f" [{self.current_phase}]" if self.current_phase and not self.finished_at else ""
+        return (
+            f"{self.operation}{phase}: {self.files} 个文件 ({self.files / elapsed:.1f} 个/秒), "
+            f"{self.bytes / 1024 / 1024:.1f} MB ({self.bytes / 1024 / 1024 / elapsed:.1f} MB/秒), "
+            f"耗时 {elapsed:.1f} 秒"
+        )
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.start_wall
+        self.cpu = time.process_time() - self.start_cpu
+        self.finished_at = datetime.now()
+        if self.profiler:
+            self.profiler.disable()
+
+    def to_dict(self):
+        elapsed = self.elapsed() or 1e-9
+        report = {
+            "operation": self.operation,
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished_at": self.finished_at.strftime("%Y-%m-%d %H:%M:%S") if self.finished_at else None,
+            "wall_seconds": round(elapsed, 6),
+            "cpu_seconds": round(self.cpu, 6),
+            "files": self.files,
+            "bytes": self.bytes,
+            "files_per_second": round(self.files / elapsed, 3),
+            "bytes_per_second": round(self.bytes / elapsed, 3),
+            "phases": {
+                name: {key: round(value, 6) for key, value in stats.items()}
+                for name, stats in self.phases.items()
+            },
+            "syscalls": dict(self.syscalls),
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+        if self.tracemalloc_started or (self.profiler and tracemalloc.is_tracing()):
+            snapshot = tracemalloc.take_snapshot()
+            report["tracemalloc_top"] = [
+                {"location": str(stat.traceback), "size": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:20]
+            ]
+        return report
+
+    def to_prometheus(self, report):
+        """
+        生成 Prometheus node_exporter 文本文件采集器格式的指标。
+        """
+        label = f'operation="{self.operation}"'
+        lines = [
+            "# TYPE file_processor_wall_seconds gauge",
+            f"file_processor_wall_seconds{{{label}}} {report['wall_seconds']}",
+            "# TYPE file_processor_cpu_seconds gauge",
+            f"file_processor_cpu_seconds{{{label}}} {report['cpu_seconds']}",
+            "# TYPE file_processor_files gauge",
+            f"file_processor_files{{{label}}} {report['files']}",
+            "# TYPE file_processor_bytes gauge",
+            f"file_processor_bytes{{{label}}} {report['bytes']}",
+            "# TYPE file_processor_phase_wall_seconds gauge",
+        ]
+        lines += [
+            f'file_processor_phase_wall_seconds{{{label},phase="{name}"}} {stats["wall"]}'
+            for name, stats in report["phases"].items()
+        ]
+        lines.append("# TYPE file_processor_phase_cpu_seconds gauge")
+        lines += [
+            f'file_processor_phase_cpu_seconds{{{label},phase="{name}"}} {stats["cpu"]}'
+            for name, stats in report["phases"].items()
+        ]
+        lines.append("# TYPE file_processor_syscalls gauge")
+        lines += [
+            f'file_processor_syscalls{{{label},syscall="{name}"}} {count}'
+            for name, count in report["syscalls"].items()
+        ]
+        if report["peak_rss_bytes"] is not None:
+            lines.append("# TYPE file_processor_peak_rss_bytes gauge")
+            lines.append(f"file_processor_peak_rss_bytes{{{label}}} {report['peak_rss_bytes']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory):
+        """
+        导出本次运行的 JSON 报告和 Prometheus 文本文件，开启性能分析时同时保存 .prof 文件。
+        :return: JSON 报告路径
+        """
+        os.makedirs(directory, exist_ok=True)
+        report = self.to_dict()
+        stem = os.path.join(directory, f"{self.operation}_{self.started_at.strftime('%Y%m%d_%H%M%S')}")
+        with open(stem + ".json", "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4, ensure_ascii=False)
+
+        # 文本文件采集器只读取固定文件名，先写临时文件再替换以保证原子性
+        prom_path = os.path.join(directory, "file_processor.prom")
+        with open(prom_path + ".tmp", "w", encoding="utf-8") as file:
+            file.write(self.to_prometheus(report))
+        os.replace(prom_path + ".tmp", prom_path)
+
+        if self.profiler:
+            self.profiler.dump_stats(stem + ".prof")
+        if self.tracemalloc_started:
+            tracemalloc.stop()
+            self.tracemalloc_started = False
+        return stem + ".json"
+
+
+def format_size(size):
+    """
+    把字节数格式化为便于阅读的字符串，如 1.5 GB。
+    """
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+def analyze_disk_usage(root, top_n=20, drill_depth=3, metrics=None):
+    """
+    单次自底向上扫描，统计每个目录、每个类别和每个后缀占用的空间。
+    多个硬链接指向同一文件时只计算一次（按设备号和 inode 识别）。
+    只保留 drill_depth 层以内目录的汇总用于下钻，最大文件和目录用有界堆保存，内存不随文件总数增长。
+    最大目录按目录自身直接包含的文件大小排名，避免根目录和最大文件的各级上层目录占满排名。
+    :param root: 分析的根目录
+    :param top_n: 保留的最大文件和最大目录数量
+    :param drill_depth: 保留汇总结果的目录层数
+    :param metrics: 记录运行指标的 OperationMetrics，可选
+    :return: 分析结果字典
+    """
+    metrics = metrics or OperationMetrics("空间分析")
+    categories = {}  # 类别 -> [文件数, 字节数]
+    extensions = {}  # 后缀 -> [文件数, 字节数]
+    top_files = []  # 最小堆: (大小, 路径)
+    top_dirs = []  # 最小堆: (目录自身文件大小, 路径)
+    tree = {}  # drill_depth 层以内的目录 -> {'size', 'files', 'children': {子目录名: 大小}}
+    seen_inodes = set()  # 已计入的多链接文件 (设备号, inode)
+    hardlinks = 0
+    errors = 0
+
+    def scan(path, depth):
+        """
+        扫描一个目录下的文件，返回待处理的帧: [路径, 层级, 字节数, 文件数, 待扫描子目录, 子目录大小]。
+        """
+        nonlocal hardlinks, errors
+        size = 0
+        files = 0
+        subdirs = []
+        try:
+            metrics.count("scandir")
+            entries = list(os.scandir(path))
+        except OSError:
+            errors += 1
+            entries = []
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                metrics.count("stat")
+                if os.name == "nt":
+                    # Windows 下 DirEntry.stat() 的链接数、设备号和 inode 均为 0，需要单独 lstat
+                    stat = os.lstat(entry.path)
+                else:
+                    stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                errors += 1
+                continue
+
+            if stat.st_nlink > 1:
+                inode = (stat.st_dev, stat.st_ino)
+                if inode in seen_inodes:
+                    hardlinks += 1
+                    continue
+                seen_inodes.add(inode)
+
+            file_size = stat.st_size
+            size += file_size
+            files += 1
+            for key, table in ((classify_file(entry.name), categories),
+                               (os.path.splitext(entry.name)[1].lower() or "(无后缀)", extensions)):
+                totals = table.setdefault(key, [0, 0])
+                totals[0] += 1
+                totals[1] += file_size
+            if len(top_files) < top_n:
+                heapq.heappush(top_files, (file_size, entry.path))
+            elif file_size > top_files[0][0]:
+                heapq.heapreplace(top_files, (file_size, entry.path))
+
+        metrics.add(files=files, bytes=size)
+        # 只有子目录、没有文件的目录不参与排名
+        if size and len(top_dirs) < top_n:
+            heapq.heappush(top_dirs, (size, path))
+        elif size and size > top_dirs[0][0]:
+            heapq.heapreplace(top_dirs, (size, path))
+        subdirs.reverse()
+        return [path, depth, size, files, subdirs, {}]
+
+    with metrics.phase("扫描"):
+        stack = [scan(root, 0)]
+        while stack:
+            frame = stack[-1]
+            if frame[4]:
+                stack.append(scan(frame[4].pop(), frame[1] + 1))
+                continue
+
+            # 子目录全部处理完毕，目录大小已完整，向上汇总
+            path, depth, size, files, _, children = stack.pop()
+            if depth <= drill_depth:
+                tree[path] = {"size": size, "files": files, "children": children}
+            if stack:
+                parent = stack[-1]
+                parent[2] += size
+                parent[3] += files
+                if parent[1] <= drill_depth:
+                    parent[5][os.path.basename(path)] = size
+
+    return {
+        "root": root,
+        "size": tree[root]["size"],
+        "files": tree[root]["files"],
+        "hardlinks": hardlinks,
+        "errors": errors,
+        "categories": categories,
+        "extensions": extensions,
+        "top_files": sorted(top_files, reverse=True),
+        "top_dirs": sorted(top_dirs, reverse=True),
+        "tree": tree,
+    }
+
+
+class InstrumentedSyncer(Syncer):
+    """
+    带运行指标的 dirsync 同步器：分别统计扫描目录、比较时间戳和复制文件的耗时，并累计复制的文件数和字节数。
+    清理多余文件、创建目录等其余时间记入“清理及其他”阶段。
+    依赖 dirsync 的内部方法和计数器（_compare、_copy、_update、_numfiles、_changed 等），按 dirsync 2.2.6 编写，
+    升级 dirsync 时需核对这些内部接口是否变化。
+    """
+
+    def __init__(self, dir1, dir2, action, metrics=None, **options):
+        super().__init__(dir1, dir2, action, **options)
+        self.metrics = metrics or OperationMetrics("同步")
+        self._timed_wall = 0.0  # 已记入各阶段的时间
+        self._timed_cpu = 0.0
+
+    def _start(self, phase):
+        self.metrics.current_phase = phase
+        return time.perf_counter(), time.process_time()
+
+    def _record(self, phase, start):
+        wall = time.perf_counter() - start[0]
+        cpu = time.process_time() - start[1]
+        self.metrics.add_phase(phase, wall, cpu)
+        self._timed_wall += wall
+        self._timed_cpu += cpu
+
+    def _add_copied(self, path):
+        try:
+            self.metrics.count("stat")
+            size = os.lstat(path).st_size
+        except OSError:
+            size = 0
+        self.metrics.add(files=1, bytes=size)
+
+    def _compare(self, dir1, dir2):
+        start = self._start("扫描目录")
+        dcmp = super()._compare(dir1, dir2)
+        self._record("扫描目录", start)
+        # dirsync 随后会对每个源端条目调用一次 os.stat
+        self.metrics.count("stat", len(dcmp.left_only) + len(dcmp.common))
+        return dcmp
+
+    def _copy(self, filename, dir1, dir2):
+        start = self._start("复制")
+        copied = self._numfiles
+        super()._copy(filename, dir1, dir2)
+        if self._numfiles > copied:
+            self.metrics.count("copy")
+            self._add_copied(os.path.join(dir1, filename))
+        self._record("复制", start)
+
+    def _update(self, filename, dir1, dir2):
+        start = self._start("比较时间戳")
+        updated = len(self._changed)
+        result = super()._update(filename, dir1, dir2)
+        self.metrics.count("stat", 2)
+        if len(self._changed) > updated:
+            # 需要更新的文件，比较和复制的时间都记入复制阶段
+            self.metrics.count("copy")
+            self._add_copied(self._changed[-1])
+            self._record("复制", start)
+        else:
+            self._record("比较时间戳", start)
+        return result
+
+    def do_work(self):
+        start = self._start("清理及其他")
+        result = super().do_work()
+        wall = time.perf_counter() - start[0] - self._timed_wall
+        cpu = time.process_time() - start[1] - self._timed_cpu
+        self.metrics.add_phase("清理及其他", wall, cpu)
+        self.metrics.count("unlink", self._numdelfiles)
+        self.metrics.count("rmdir", self._numdeldirs)
+        self.metrics.count("mkdir", self._numnewdirs)
+        return result
+
+
+def compress_chunk(data, codec, level=None):
+    """
+    独立压缩一个数据块，生成可单独解压的 zstd 帧或 xz 流。
+    """
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level or 3).compress(data)
+    return lzma.compress(data, preset=6 if level is None else level)
+
+
+def decompress_chunk(data, codec, raw_size):
+    """
+    解压由 compress_chunk 生成的数据块。
+    """
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=raw_size)
+    return lzma.decompress(data)
+
+
+class ChunkedArchiveWriter:
+    """
+    分块压缩写入器：把 tar 数据流切成固定大小的块，多线程独立压缩后按顺序写入目标文件，
+    并记录每块在原始流和压缩文件中的偏移，用于单个文件的随机还原。
+    """
+
+    def __init__(self, fileobj, codec="zstd", level=None, chunk_size=ARCHIVE_CHUNK_SIZE, workers=None):
+        if codec == "zstd" and zstandard is None:
+            codec = "xz"
+        self.fileobj = fileobj
+        self.codec = codec
+        self.level = level
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()  # 等待按顺序写出的压缩任务
+        self.buffer = bytearray()
+        self.raw_offset = 0  # 已提交压缩的原始字节数
+        self.compressed_offset = 0  # 已写入目标文件的压缩字节数
+        self.chunks = []  # 每块: [原始偏移, 原始长度, 压缩偏移, 压缩长度]
+
+    def tell(self):
+        return self.raw_offset + len(self.buffer)
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            chunk = bytes(self.buffer[:self.chunk_size])
+            del self.buffer[:self.chunk_size]
+            self._submit(chunk)
+        return len(data)
+
+    def _submit(self, chunk):
+        future = self.executor.submit(compress_chunk, chunk, self.codec, self.level)
+        self.pending.append((self.raw_offset, len(chunk), future))
+        self.raw_offset += len(chunk)
+        # 限制在途块数量，保证内存占用有界
+        while len(self.pending) > self.workers * 2:
+            self._write_next()
+
+    def _write_next(self):
+        raw_offset, raw_size, future = self.pending.popleft()
+        data = future.result()
+        self.fileobj.write(data)
+        self.chunks.append([raw_offset, raw_size, self.compressed_offset, len(data)])
+        self.compressed_offset += len(data)
+
+    def close(self):
+        try:
+            if self.buffer:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self._write_next()
+        finally:
+            self.executor.shutdown()
+
+
+def archive_index_path(archive_path):
+    return archive_path + ".index.json"
+
+
+def load_archive_index(archive_path):
+    with open(archive_index_path(archive_path), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def find_latest_archive(target, source, exclude=None):
+    """
+    在目标目录中查找同一源目录最近一次生成的归档，没有则返回 None。
+    归档名须精确匹配 "<源目录名>_<时间戳>.tar.*"，且索引中记录的源路径须与 source 相同，
+    避免名称前缀相同的其他源目录（如 X 与 X_old）被误认为同一增量链。
+    :param exclude: 需要排除的归档路径（例如正在写入的新归档）
+    """
+    prefix = os.path.basename(os.path.normpath(source)) or "archive"
+    pattern = re.compile(re.escape(prefix) + r"_(\d{8}_\d{6}(?:_\d{6})?)\.tar\.(?:zst|xz)\.index\.json")
+    candidates = []
+    for name in os.listdir(target):
+        match = pattern.fullmatch(name)
+        if match:
+            candidates.append((match.group(1), name[:-len(".index.json")]))
+
+    source_key = os.path.normcase(os.path.abspath(source))
+    for _, name in sorted(candidates, reverse=True):
+        archive_path = os.path.join(target, name)
+        if exclude and os.path.normcase(os.path.abspath(archive_path)) == os.path.normcase(os.path.abspath(exclude)):
+            continue
+        try:
+            index = load_archive_index(archive_path)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if os.path.normcase(os.path.abspath(index.get("source", ""))) == source_key:
+            return archive_path
+    return None
+
+
+class PaddedFileReader:
+    """
+    为 tar 读取文件内容，保证恰好返回 size 字节：文件在归档过程中变短或读取出错时用零字节补齐并记录错误，
+    使 tar 流保持完整，出错的条目由调用方从索引中剔除。
+    """
+
+    def __init__(self, file, size):
+        self.file = file
+        self.remaining = size
+        self.error = None
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = b""
+        if self.error is None:
+            try:
+                data = self.file.read(size)
+            except OSError as e:
+                self.error = e
+            else:
+                if len(data) < size:
+                    self.error = OSError("文件在归档过程中被截断")
+        self.remaining -= size
+        return data + bytes(size - len(data))
+
+
+def create_archive_backup(source, target, codec="zstd", changed_only=True, metrics=None):
+    """
+    将源目录流式写入分块压缩的 tar 归档，并生成可随机访问的索引文件。
+    :param source: 源路径
+    :param target: 归档保存目录
+    :param codec: 压缩格式 ('zstd' 或 'xz')，zstandard 未安装时使用 xz
+    :param changed_only: 是否只归档相对上一次归档有变化的文件
+    :param metrics: 记录运行指标的 OperationMetrics，可选
+    :return: (归档路径, 索引数据)，无法读取的文件记录在索引的 skipped 中，不会中止归档
+    """
+    metrics = metrics or OperationMetrics("归档备份")
+    if os.path.normcase(os.path.abspath(target)) == os.path.normcase(os.path.abspath(source)):
+        raise ValueError("归档保存目录不能是源目录本身")
+    os.makedirs(target, exist_ok=True)
+    prefix = os.path.basename(os.path.normpath(source)) or "archive"
+
+    if codec == "zstd" and zstandard is None:
+        codec = "xz"
+    extension = ".tar.zst" if codec == "zstd" else ".tar.xz"
+    previous_files = {}
+    base_archive = find_latest_archive(target, source) if changed_only else None
+    if base_archive:
+        previous_index = load_archive_index(base_archive)
+        previous_files = previous_index["known"]
+
+    # 时间戳精确到微秒，并以独占方式创建，绝不覆盖已有归档
+    while True:
+        archive_path = os.path.join(target, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{extension}")
+        if base_archive and os.path.basename(base_archive) == os.path.basename(archive_path):
+            continue  # 增量链的上一个归档不能是本归档自身
+        try:
+            output = open(archive_path, "xb", buffering=1024 * 1024)
+            break
+        except FileExistsError:
+            continue
+
+    # 归档目录位于源目录内时不扫描它，否则每次都会把以前的归档和正在写入的归档打包进去
+    exclude_dir = os.path.normcase(os.path.abspath(target))
+    files = {}  # 本归档包含的文件: 名称 -> [起始偏移, 结束偏移, 大小, 修改时间]
+    known = {}  # 截至本次归档的全部文件: 名称 -> [大小, 修改时间]
+    skipped = []  # 无法读取的文件: [名称, 错误]
+    raw_bytes = 0
+
+    def skip(arcname, error):
+        # 跳过的文件沿用上一次归档的记录，不会被当作已删除，下次归档时重试
+        skipped.append([arcname, str(error)])
+        known.pop(arcname, None)
+        if arcname in previous_files:
+            known[arcname] = previous_files[arcname]
+
+    try:
+        with metrics.phase("打包压缩"), output:
+            writer = ChunkedArchiveWriter(output, codec=codec)
+            try:
+                with tarfile.TarFile(fileobj=writer, mode="w", format=tarfile.PAX_FORMAT) as tar:
+                    for root, dirs, names in os.walk(source):
+                        metrics.count("scandir")
+                        dirs[:] = sorted(
+                            name for name in dirs
+                            if os.path.normcase(os.path.abspath(os.path.join(root, name))) != exclude_dir
+                        )
+                        for name in sorted(names):
+                            path = os.path.join(root, name)
+                            arcname = os.path.relpath(path, source).replace(os.sep, "/")
+                            try:
+                                metrics.count("stat")
+                                tarinfo = tar.gettarinfo(path, arcname)
+                            except OSError as e:
+                                skip(arcname, e)
+                                continue
+                            if tarinfo is None or not (tarinfo.isfile() or tarinfo.issym()):
+                                continue
+
+                            known[arcname] = [tarinfo.size, tarinfo.mtime]
+                            if previous_files.get(arcname) == known[arcname]:
+                                continue
+
+                            start = writer.tell()
+                            if tarinfo.isfile():
+                                try:
+                                    metrics.count("open")
+                                    f = open(path, "rb")
+                                except OSError as e:  # 例如 Windows 下被其他程序锁定，或扫描后已被删除
+                                    skip(arcname, e)
+                                    continue
+                                with f:
+                                    reader = PaddedFileReader(f, tarinfo.size)
+                                    tar.addfile(tarinfo, reader)
+                                if reader.error:
+                                    skip(arcname, reader.error)
+                                    continue
+                            else:
+                                tar.addfile(tarinfo)
+                            files[arcname] = [start, writer.tell(), tarinfo.size, tarinfo.mtime]
+                            raw_bytes += tarinfo.size
+                            metrics.add(files=1, bytes=tarinfo.size)
+            finally:
+                writer.close()
+    except BaseException:
+        # 归档失败时删除写了一半、没有索引的归档文件
+        try:
+            os.remove(archive_path)
+        except OSError:
+            pass
+        raise
+
+    index = {
+        "codec": writer.codec,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source": os.path.abspath(source),
+        "base": os.path.basename(base_archive) if base_archive else None,
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": writer.compressed_offset,
+        "chunks": writer.chunks,
+        "files": files,
+        "known": known,
+        "deleted": sorted(set(previous_files) - set(known)),
+        "skipped": skipped,
+    }
+    index_path = archive_index_path(archive_path)
+    with metrics.phase("写入索引"):
+        try:
+            with open(index_path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(index, file, ensure_ascii=False)
+            os.replace(index_path + ".tmp", index_path)
+        except BaseException:
+            for path in (index_path + ".tmp", archive_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise
+    return archive_path, index
+
+
+def read_archive_range(archive_path, index, start, end):
+    """
+    只解压覆盖原始流区间 [start, end) 的压缩块，返回该区间的原始数据。
+    """
+    chunks = index["chunks"]
+    first = bisect.bisect_right([chunk[0] for chunk in chunks], start) - 1
+    data = bytearray()
+    with open(archive_path, "rb") as file:
+        for raw_offset, raw_size, compressed_offset, compressed_size in chunks[first:]:
+            if raw_offset >= end:
+                break
+            file.seek(compressed_offset)
+            data += decompress_chunk(file.read(compressed_size), index["codec"], raw_size)
+    skip = start - chunks[first][0]
+    return bytes(data[skip:skip + end - start])
+
+
+def restore_archive_member(archive_path, member, dest_dir):
+    """
+    从归档中还原单个文件，若本次归档未包含该文件则沿增量链向更早的归档查找。
+    :return: 还原后的文件路径
+    """
+    index = load_archive_index(archive_path)
+    visited = {os.path.normcase(os.path.abspath(archive_path))}
+    while member not in index["files"]:
+        if not index.get("base"):
+            raise KeyError(f"归档中不存在文件: {member}")
+        archive_path = os.path.join(os.path.dirname(archive_path), index["base"])
+        archive_key = os.path.normcase(os.path.abspath(archive_path))
+        if archive_key in visited:
+            raise ValueError(f"归档增量链存在循环: {index['base']}")
+        visited.add(archive_key)
+        index = load_archive_index(archive_path)
+
+    start, end = index["files"][member][:2]
+    data = read_archive_range(archive_path, index, start, end)
+    with tarfile.open(fileobj=BytesIO(data + tarfile.NUL * tarfile.BLOCKSIZE * 2), mode="r:") as tar:
+        tarinfo = tar.getmember(member)
+        if hasattr(tarfile, "data_filter"):
+            tar.extract(tarinfo, dest_dir, filter="data")
+        else:
+            tar.extract(tarinfo, dest_dir)
+    return os.path.join(dest_dir, *member.split("/"))
+
+
+class CompactTree:
+    """
+    紧凑的扫描结果存储：每个条目只占用若干列中的一个位置，而不是一个对象加一条完整路径。
+    - 目录名驻留在目录名表中，条目只保存编号；文件名通常各不相同，按文件系统编码连续存放在一块字节缓冲中，
+      条目只保存偏移和长度，不为每个文件名创建字符串对象
+    - 父目录用整数下标表示，父目录总在子条目之前，逆序遍历即为自底向上
+    - 大小、修改时间、类别编码保存在 array 列中，安装了 NumPy 时可向量化筛选
+    - inode 列按需开启（with_inode=True）：Windows 下每次 DirEntry.inode() 都是一次额外的系统调用
+    目录的大小和修改时间记为 0，类别编码为 -1。
+    """
+
+    DIRECTORY = -1
+
+    def __init__(self, root, with_inode=False):
+        self.dir_names = []  # 目录名表
+        self.dir_name_ids = {}  # 目录名 -> 编号
+        self.file_names = bytearray()  # 所有文件名的编码字节
+        self._categories = {}  # 后缀 -> 类别编码，类别只与后缀有关，同一后缀只判断一次
+        self.parent = array("i")
+        self.name = array("q")  # 目录为目录名编号，文件为文件名在 file_names 中的偏移
+        self.name_length = array("H")  # 文件名编码后的字节数，目录为 0
+        self.size = array("q")
+        self.mtime_ns = array("q")
+        self.inode = array("Q") if with_inode else None  # 未开启时为 None
+        self.category = array("b")
+        self._dir_paths = {}  # 目录路径缓存，加速同一目录下条目的路径还原
+        self.root = root
+        self.append(-1, root, 0, 0, is_dir=True)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def category_code(self, name):
+        """
+        返回文件名的类别编码。classify_file 只依据最后两级后缀判断，因此按后缀缓存结果。
+        """
+        stem, ext = os.path.splitext(name)
+        suffix = os.path.splitext(stem)[1] + ext
+        code = self._categories.get(suffix)
+        if code is None:
+            code = CATEGORY_CODES[classify_file("x" + suffix)]
+            self._categories[suffix] = code
+        return code
+
+    def append(self, parent, name, size, mtime_ns, inode=0, is_dir=False):
+        if is_dir:
+            name_id = self.dir_name_ids.get(name)
+            if name_id is None:
+                name_id = len(self.dir_names)
+                self.dir_names.append(name)
+                self.dir_name_ids[name] = name_id
+            self.name.append(name_id)
+            self.name_length.append(0)
+            self.category.append(self.DIRECTORY)
+        else:
+            encoded = os.fsencode(name)
+            self.name.append(len(self.file_names))
+            self.name_length.append(len(encoded))
+            self.file_names += encoded
+            self.category.append(self.category_code(name))
+        self.parent.append(parent)
+        self.size.append(size)
+        self.mtime_ns.append(mtime_ns)
+        if self.inode is not None:
+            self.inode.append(inode)
+        return len(self.parent) - 1
+
+    @classmethod
+    def scan(cls, root, name_filter=None, exclude_dir=None, with_inode=False, metrics=None):
+        """
+        扫描目录树。目录全部保留；文件只保留通过 name_filter 的条目，且只对这些文件读取元数据。
+        :param root: 扫描的根目录
+        :param name_filter: 文件名过滤函数，返回 False 的文件不保存
+        :param exclude_dir: 不扫描的目录
+        :param with_inode: 是否读取并保存 inode 列
+        :param metrics: 记录运行指标的 OperationMetrics，可选
+        """
+        metrics = metrics or OperationMetrics("扫描")
+        exclude_dir = os.path.normcase(os.path.abspath(exclude_dir)) if exclude_dir else None
+        tree = cls(root, with_inode=with_inode)
+
+        def inode_of(entry):
+            if not with_inode:
+                return 0
+            if os.name == "nt":
+                # Windows 下 DirEntry.stat() 的 st_ino 恒为 0，inode() 需要单独的系统调用才能取得真实编号
+                metrics.count("stat")
+            return entry.inode()
+
+        stack = [(0, root)]
+        while stack:
+            index, directory = stack.pop()
+            try:
+                metrics.count("scandir")
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if exclude_dir and os.path.normcase(os.path.abspath(entry.path)) == exclude_dir:
+                            continue
+                        child = tree.append(index, entry.name, 0, 0, inode_of(entry), is_dir=True)
+                        stack.append((child, entry.path))
+                        continue
+                    if name_filter and not name_filter(entry.name):
+                        continue
+                    metrics.count("stat")
+                    stat = entry.stat(follow_symlinks=False)
+                    inode = inode_of(entry)
+                except OSError:
+                    continue
+                tree.append(index, entry.name, stat.st_size, stat.st_mtime_ns, inode)
+        return tree
+
+    def name_of(self, index):
+        """
+        返回条目的名称。
+        """
+        if self.category[index] == self.DIRECTORY:
+            return self.dir_names[self.name[index]]
+        offset = self.name[index]
+        return os.fsdecode(bytes(self.file_names[offset:offset + self.name_length[index]]))
+
+    def path(self, index):
+        """
+        由父目录下标还原完整路径。
+        """
+        if index == 0:
+            return self.root
+        parent = self.parent[index]
+        parent_path = self._dir_paths.get(parent)
+        if parent_path is None:
+            parent_path = self.path(parent)
+            if len(self._dir_paths) >= 65536:
+                self._dir_paths.clear()
+            self._dir_paths[parent] = parent_path
+        return os.path.join(parent_path, self.name_of(index))
+
+    def column(self, name):
+        """
+        返回指定列；安装了 NumPy 时返回共享内存的 ndarray 视图，否则返回 array 本身。
+        """
+        data = getattr(self, name)
+        return np.frombuffer(data, dtype=data.typecode) if np is not None and len(data) else data
+
+    def select(self, min_size=None, max_size=None, categories=None, mtime_before_ns=None):
+        """
+        按条件筛选文件（不含目录），返回条目下标列表。
+        :param categories: 类别名称列表，取值见 FILE_CATEGORIES
+        :param mtime_before_ns: 只选择修改时间早于该时间戳（纳秒）的文件
+        """
+        codes = [CATEGORY_CODES[category] for category in categories] if categories else None
+        if np is not None and len(self):
+            category = self.column("category")
+            size = self.column("size")
+            mask = category != self.DIRECTORY
+            if min_size is not None:
+                mask &= size >= min_size
+            if max_size is not None:
+                mask &= size <= max_size
+            if codes:
+                mask &= np.isin(category, codes)
+            if mtime_before_ns is not None:
+                mask &= self.column("mtime_ns") < mtime_before_ns
+            return np.flatnonzero(mask).tolist()
+
+        return [
+            index for index in range(len(self))
+            if self.category[index] != self.DIRECTORY
+            and (min_size is None or self.size[index] >= min_size)
+            and (max_size is None or self.size[index] <= max_size)
+            and (codes is None or self.category[index] in codes)
+            and (mtime_before_ns is None or self.mtime_ns[index] < mtime_before_ns)
+        ]
+
+    def ancestors(self, indices):
+        """
+        返回给定条目下标及其所有上级目录的下标（不含根目录），子目录排在父目录之前，可直接用于自底向上删除。
+        """
+        result = set()
+        for index in indices:
+            while index > 0 and index not in result:
+                result.add(index)
+                index = self.parent[index]
+        return sorted(result, reverse=True)
+
+    def memory_bytes(self):
+        """
+        统计本对象占用的全部内存字节数：各列、文件名缓冲、目录名表及索引、后缀缓存和路径缓存。
+        """
+        columns = (self.parent, self.name, self.name_length, self.size, self.mtime_ns, self.category)
+        total = sum(sys.getsizeof(column) for column in columns) + sys.getsizeof(self.file_names)
+        if self.inode is not None:
+            total += sys.getsizeof(self.inode)
+        total += sys.getsizeof(self.dir_names) + sum(sys.getsizeof(name) for name in self.dir_names)
+        total += sys.getsizeof(self.dir_name_ids)
+        total += sys.getsizeof(self._categories) + sum(sys.getsizeof(suffix) for suffix in self._categories)
+        total += sys.getsizeof(self._dir_paths) + sum(sys.getsizeof(path) for path in self._dir_paths.values())
+        return total
+
+
+def plan_delete(root, extensions=(), patterns=(), older_than_days=None, min_size=None, max_size=None,
+                categories=(), exclude_dir=None, metrics=None):
+    """
+    单次扫描目录，按筛选条件生成删除计划（不做任何删除，可作为预览）。
+    各类条件同时满足才会匹配，同一类条件内任一项满足即可。
+    :param root: 扫描的根目录
+    :param extensions: 后缀列表，如 ('.log', '.tmp')
+    :param patterns: 文件名通配符列表，如 ('*~', 'cache_*')
+    :param older_than_days: 只匹配修改时间早于若干天的文件
+    :param min_size: 最小文件大小（字节）
+    :param max_size: 最大文件大小（字节）
+    :param categories: 文件类别列表，取值见 FILE_CATEGORIES
+    :param exclude_dir: 不扫描的目录（例如位于根目录内的暂存目录）
+    :param metrics: 记录运行指标的 OperationMetrics，可选
+    :return: {'tree': CompactTree, 'files': 匹配文件的下标, 'bytes': 总字节数}
+    """
+    metrics = metrics or OperationMetrics("删除文件")
+    extensions = tuple(ext.lower() for ext in extensions)
+    patterns = tuple(patterns)
+
+    def name_filter(name):
+        if extensions and not name.lower().endswith(extensions):
+            return False
+        return not patterns or any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    # 按名称的条件在扫描时判断，不匹配的文件不读取元数据也不保存
+    with metrics.phase("扫描"):
+        tree = CompactTree.scan(
+            root, name_filter if extensions or patterns else None, exclude_dir=exclude_dir, metrics=metrics
+        )
+
+    with metrics.phase("筛选"):
+        cutoff = time.time_ns() - int(older_than_days * 86400 * 10 ** 9) if older_than_days is not None else None
+        files = array("q", tree.select(min_size, max_size, categories or None, cutoff))
+        total_bytes = sum(tree.size[index] for index in files)
+    return {"tree": tree, "files": files, "bytes": total_bytes}
+
+
+def _delete_batch(tree, batch, root, staging_dir, metrics):
+    """
+    删除（或移动到暂存目录）一批文件，返回 (成功数, 成功字节数, 错误列表, 被清理文件所在目录的下标集合)。
+    :param batch: 文件在 tree 中的下标
+    """
+    deleted = 0
+    deleted_bytes = 0
+    errors = []
+    touched_dirs = set()
+    for index in batch:
+        path = tree.path(index)
+        size = tree.size[index]
+        try:
+            if staging_dir:
+                staged_path = os.path.join(staging_dir, os.path.relpath(path, root))
+                os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+                if os.path.lexists(staged_path):
+                    raise FileExistsError(f"暂存目录中已存在同名文件: {staged_path}")
+                try:
+                    metrics.count("rename")
+                    os.replace(path, staged_path)
+                except OSError:
+                    # 跨磁盘时无法直接重命名，退回到复制后删除
+                    shutil.move(path, staged_path)
+            else:
+                metrics.count("unlink")
+                os.unlink(path)
+            deleted += 1
+            deleted_bytes += size
+            touched_dirs.add(tree.parent[index])
+        except OSError as e:
+            errors.append((path, e))
+    return deleted, deleted_bytes, errors, touched_dirs
+
+
+def execute_delete(plan, root, staging_dir=None, remove_empty_dirs=False, workers=8, batch_size=500,
+                   metrics=None):
+    """
+    按删除计划分批并行删除文件，可选移动到暂存目录，最后自底向上删除因此变空的目录。
+    只会尝试删除包含被清理文件的目录及其上级目录，原本就为空的其他目录不受影响。
+    每次移动到暂存目录下以时间命名的新子目录中，多次清理同一路径的文件不会互相覆盖。
+    :return: {'files': 成功数, 'bytes': 成功字节数, 'dirs': 删除的目录数, 'errors': [(路径, 异常), ...],
+              'staging_dir': 本次使用的暂存子目录或 None}
+    """
+    metrics = metrics or OperationMetrics("删除文件")
+    if staging_dir:
+        while True:
+            run_dir = os.path.join(staging_dir, datetime.now().strftime("%Y%m%d_%H%M%S_%f"))
+            try:
+                os.makedirs(run_dir)
+                break
+            except FileExistsError:
+                continue
+        staging_dir = run_dir
+    tree = plan["tree"]
+    files = plan["files"]
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    result = {"files": 0, "bytes": 0, "dirs": 0, "errors": [], "staging_dir": staging_dir}
+    touched_dirs = set()
+    with metrics.phase("删除"), ThreadPoolExecutor(max_workers=workers) as executor:
+        for deleted, deleted_bytes, errors, batch_dirs in executor.map(
+                lambda batch: _delete_batch(tree, batch, root, staging_dir, metrics), batches):
+            result["files"] += deleted
+            result["bytes"] += deleted_bytes
+            result["errors"].extend(errors)
+            touched_dirs |= batch_dirs
+            metrics.add(files=deleted, bytes=deleted_bytes)
+
+    if remove_empty_dirs:
+        with metrics.phase("删除空目录"):
+            for index in tree.ancestors(touched_dirs):
+                try:
+                    metrics.count("rmdir")
+                    os.rmdir(tree.path(index))  # 非空目录会失败，直接跳过
+                    result["dirs"] += 1
+                except OSError:
+                    pass
+    return result
+
+
 class FileProcessorUI(QMainWindow):
     def __init__(self):
         """
@@ -53,8 +1441,24 @@ class FileProcessorUI(QMainWindow):
 
         # 初始化界面
         self.current_path = ""  # 用于存储当前选择的文件或文件夹路径
+        self.task_running = False  # 是否有备份、获取名称、删除、空间分析等后台任务正在运行（同一时间只运行一个）
+        self.task_thread = None  # 正在执行的后台任务线程
+        self.task_results = queue.Queue()  # 后台任务结果，由定时器在界面线程处理
+        self.active_metrics = None  # 正在状态栏显示的运行指标
+        self.profile_enabled = os.environ.get("FILE_PROCESSOR_PROFILE") == "1"  # 是否开启性能分析
+        self.content_sniffing = False  # 获取名称时是否按文件内容识别类型
         self.init_ui()
 
+        # 异步日志管道：备份日志写入滚动日志文件，并由定时器批量刷新到日志框
+        self.log_pipeline = LogPipeline(os.path.join(os.getcwd(), BACKUP_LOG_FILE))
+        self.log_pipeline.attach("dirsync", backup_logger.name)
+        self.log_pipeline.start()
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log_pipeline)
+        self.log_timer.timeout.connect(self.update_metrics_status)
+        self.log_timer.timeout.connect(self.process_task_results)
+        self.log_timer.start(100)
+
     def init_ui(self):
         """
         初始化界面布局和组件。
@@ -98,10 +1502,12 @@ class FileProcessorUI(QMainWindow):
         third_row.addWidget(self.backup_file_button)
         # 绑定到创建文件按钮
         self.create_file_button.clicked.connect(self.create_files_from_txt)
+        self.delete_file_button.clicked.connect(self.show_delete_dialog)
         self.backup_file_button.clicked.connect(self.show_backup_dialog)
         # 第四排按钮
         fourth_row = QHBoxLayout()
-        self.undefined_button_1 = QPushButton("待定义..")
+        self.undefined_button_1 = QPushButton("空间分析")
+        self.undefined_button_1.clicked.connect(self.show_disk_usage)
         self.undefined_button_2 = QPushButton("待定义..")
         self.undefined_button_3 = QPushButton("待定义..")
         fourth_row.addWidget(self.undefined_button_1)
@@ -142,6 +1548,17 @@ class FileProcessorUI(QMainWindow):
         caidan_menu.addAction(save_log_action)
         save_log_action.setStatusTip("保存当前日志到文件")
 
+        sniff_action = QAction("按内容识别文件类型", self)
+        sniff_action.setCheckable(True)
+        sniff_action.setStatusTip("获取名称时读取文件头判断类型，结果按文件缓存")
+        caidan_menu.addAction(sniff_action)
+
+        profile_action = QAction("性能分析", self)
+        profile_action.setCheckable(True)
+        profile_action.setChecked(self.profile_enabled)
+        profile_action.setStatusTip(f"运行时开启 cProfile/tracemalloc，结果保存到 {METRICS_DIR} 目录")
+        caidan_menu.addAction(profile_action)
+
         update_action = QAction("检查更新", self)
         about_action = QAction("关于文件处理器", self)
         help_menu.addAction(update_action)
@@ -149,6 +1566,8 @@ class FileProcessorUI(QMainWindow):
 
         # 连接菜单项的信号
         save_log_action.triggered.connect(self.save_log) # 保存日志
+        profile_action.toggled.connect(lambda checked: setattr(self, "profile_enabled", checked)) # 性能分析
+        sniff_action.toggled.connect(lambda checked: setattr(self, "content_sniffing", checked)) # 按内容识别文件类型
         update_action.triggered.connect(self.show_update_dialog) # 检查更新
         about_action.triggered.connect(self.show_about_message) # 关于文件处理器
 
@@ -176,52 +1595,157 @@ class FileProcessorUI(QMainWindow):
             self.log_output.append("无效的路径，请选择有效的文件夹~!")
             return
 
-        self.log_output.append(f"\n正在列出路径: {self.current_path}\n")
+        path = self.current_path
+        content_sniffing = self.content_sniffing
+
+        def work():
+            # 开启内容识别时按文件头判断类型，结果缓存在本地文件中
+            classifier = None
+            if content_sniffing:
+                classifier = ContentClassifier(ContentTypeCache(os.path.join(os.getcwd(), CONTENT_TYPE_CACHE_FILE)))
+
+            # 调用递归函数开始处理文件夹和文件，输出行先收集起来，完成后一次性显示
+            lines = []
+            metrics = self.begin_metrics("获取名称")
+            try:
+                with metrics.phase("列出"):
+                    self._iterate_directory(path, metrics=metrics, classifier=classifier, lines=lines)
+            finally:
+                if classifier:
+                    classifier.close()
+                    metrics.count("stat", classifier.hits + classifier.misses)
+                    metrics.count("open", classifier.misses)
+                    try:
+                        classifier.cache.save()
+                    except OSError as e:
+                        lines.append((f"文件类型缓存保存失败: {e}", "red"))
+                self.end_metrics(metrics)
+            return lines
+
+        def done(lines, error):
+            if error:
+                self.append_to_log(f"获取名称失败: {error}", "red")
+                return
+            self.append_lines_to_log(lines)
 
-        # 调用递归函数开始处理文件夹和文件
-        self._iterate_directory(self.current_path)
+        if self.start_task(work, done):
+            self.log_output.append(f"\n正在列出路径: {path}\n")
 
-    def _iterate_directory(self, directory, indent=0):
+    def _iterate_directory(self, directory, indent=0, metrics=None, classifier=None, lines=None):
         """
-        遍历目录，递归列出所有文件和文件夹，并在日志框中输出缩进格式。
+        遍历目录，递归列出所有文件和文件夹，生成缩进格式的日志行（不操作界面，可在后台线程调用）。
         :param directory: 当前遍历的目录路径
         :param indent: 当前层级的缩进
+        :param metrics: 记录运行指标的 OperationMetrics，可选
+        :param classifier: 按内容识别类型的 ContentClassifier，为 None 时按文件名判断
+        :param lines: 收集 (文本, 颜色) 的列表，为 None 时新建
+        :return: list: 日志行列表
         """
+        metrics = metrics or OperationMetrics("获取名称")
+        lines = [] if lines is None else lines
         try:
-            # 获取目录下的所有文件和文件夹
-            items = os.listdir(directory)
-
-            for item in items:
-                item_path = os.path.join(directory, item)
-
-                if os.path.isdir(item_path):  # 如果是文件夹
-                    self.append_to_log(f"{'    ' * indent}[目录] {item}", "Blue") #蓝色文件夹或目录
+            # 获取目录下的所有文件和文件夹，类型直接取自目录项，只有符号链接需要额外 stat
+            metrics.count("scandir")
+            with os.scandir(directory) as iterator:
+                items = []  # (名称, 路径, 是否目录)，既不是目录也不是文件的条目跳过
+                for entry in iterator:
+                    try:
+                        if entry.is_symlink():
+                            metrics.count("stat")
+                        if entry.is_dir():
+                            items.append((entry.name, entry.path, True))
+                        elif entry.is_file():
+                            items.append((entry.name, entry.path, False))
+                    except OSError:
+                        continue
+
+            # 当前目录的文件先批量并行识别类型，再按原顺序输出
+            categories = {}
+            if classifier:
+                file_paths = [item_path for _, item_path, is_dir in items if not is_dir]
+                categories = dict(zip(file_paths, classifier.classify_many(file_paths)))
+
+            for item, item_path, is_dir in items:
+                if is_dir:  # 如果是文件夹
+                    lines.append((f"{'    ' * indent}[目录] {item}", "Blue")) #蓝色文件夹或目录
                     # 递归调用处理子文件夹
-                    self._iterate_directory(item_path, indent + 1)
-                elif os.path.isfile(item_path):  # 如果是文件
-                    # 获取文件的 MIME 类型
-                    mime_type, _ = mimetypes.guess_type(item_path)
-                    ext = os.path.splitext(item)[1].lower()
-
-                    if mime_type and mime_type.startswith("image"):
-                        color = "magenta"  # 品红色图像文件
-                    elif mime_type and mime_type.startswith("text")or ext in [".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".odt", ".ods", ".odp", ".odg", ".odf", ".rtf", ".tex", ".md", ".txt", ".log", ".ini", ".conf", ".cfg", ".yaml", ".yml",".json", ".xml", ".csv", ".tsv", ".xls",".eml"]:
-                        color = "Slate Grey"  # 石板灰色文本文件
-                    elif mime_type and mime_type.startswith("application/zip") or ext in [
-                        ".zip", ".rar", ".7z", ".tar", ".gz", ".bz2", ".xz", ".iso", ".dmg", ".img", ".iso", ".arj", ".vdi", ".vhd", ".zipx", ".ace", ".cab", ".lz", ".lzma", ".tar.bz2", ".tar.gz", ".tar.lzma", ".tar.xz", ".tar.zst", ".tar.z", ".tar.Z",]:
-                        color = "red"  # 红色压缩文件
-                    elif ext in [".exe", ".bat", ".cmd", ".msi", ".sh", ".py", ".js", ".html", ".css", ".php", ".java", ".cpp", ".c", ".h", ".go", ".rb", ".pl", ".jar", ".ps1", ".vbs", ".vb", ".dmg", ".ts", ".tsx", ".app", ".pyw", ".pyi", ".pyc", ".pyo", ".pyd", ".pyz", ".ap", ".apk"]:
-                        color = "green"  # 绿色可执行文件
-                    elif ext in [".mp3",".wav",".flac",".aac",".alac",".m4a",".amr",".ogg",".ape",".wma",".opus",".midi"]:
-                        color = "Pink"  # 粉色音频文件
-                    elif ext in [".mp4", ".avi", ".mov", ".wmv", ".mkv", ".flv", ".webm", ".ogg", ".ogv", ".ogm", ".m4v", ".mpg", ".mpeg", ".m2v", ".mts", ".m2ts", ".ts", ".3gp", ".3g2", ".m3u8", ".m3u", ".m3u8", ]:
-                        color = "Orange"  # 橙色视频文件
-                    else:
-                        color = "Charcoal Black"  # 碳黑其他文件
+                    self._iterate_directory(item_path, indent + 1, metrics, classifier, lines)
+                else:  # 如果是文件
+                    color = CATEGORY_COLORS[categories.get(item_path) or classify_file(item)]
+                    metrics.add(files=1)
 
-                    self.append_to_log(f"{'    ' * indent}{item}", color)
+                    lines.append((f"{'    ' * indent}{item}", color))
         except Exception as e:
-            self.append_to_log(f"无法访问目录 {directory}: {e}", "black")
+            lines.append((f"无法访问目录 {directory}: {e}", "black"))
+        return lines
+
+    def show_disk_usage(self):
+        """
+        分析当前路径的空间占用，输出按类别、后缀、最大文件和最大目录的汇总，并支持逐层下钻查看目录大小。
+        """
+        if not self.current_path or not os.path.isdir(self.current_path):
+            self.log_output.append("无效的路径，请选择有效的文件夹~!")
+            return
+
+        path = self.current_path
+
+        def work():
+            metrics = self.begin_metrics("空间分析")
+            try:
+                report = analyze_disk_usage(path, metrics=metrics)
+            finally:
+                report_path = self.end_metrics(metrics)
+            return report, metrics, report_path
+
+        def done(result, error):
+            if error:
+                self.append_to_log(f"空间分析失败: {error}", "red")
+                return
+            self._show_disk_usage_report(*result)
+
+        if self.start_task(work, done):
+            self.log_output.append(f"\n正在分析空间占用: {path}\n")
+
+    def _show_disk_usage_report(self, report, metrics, report_path):
+        """
+        在日志框输出空间分析结果，并弹出对话框逐层下钻查看目录大小（在界面线程调用）。
+        """
+        self.append_to_log(
+            f"总计 {report['files']} 个文件，{format_size(report['size'])}"
+            f"（重复硬链接 {report['hardlinks']} 个，无法访问 {report['errors']} 项）", "blue"
+        )
+        self.append_to_log("按类别：", "blue")
+        for category, (files, size) in sorted(report["categories"].items(), key=lambda item: -item[1][1]):
+            self.append_to_log(f"    {category}: {format_size(size)} ({files} 个文件)", CATEGORY_COLORS[category])
+        self.append_to_log("按后缀（前 10）：", "blue")
+        for ext, (files, size) in sorted(report["extensions"].items(), key=lambda item: -item[1][1])[:10]:
+            self.append_to_log(f"    {ext}: {format_size(size)} ({files} 个文件)", "Slate Grey")
+        self.append_to_log("最大的文件：", "blue")
+        for size, path in report["top_files"]:
+            self.append_to_log(f"    {format_size(size)}  {path}", "Slate Grey")
+        self.append_to_log("自身文件占用最大的目录（不含子目录）：", "blue")
+        for size, path in report["top_dirs"]:
+            self.append_to_log(f"    {format_size(size)}  {path}", "Slate Grey")
+        self.append_to_log(f"{metrics.summary()}，运行报告: {report_path}", "blue")
+
+        # 逐层下钻：只能进入分析时保留了汇总的目录
+        path = report["root"]
+        while path in report["tree"]:
+            children = sorted(report["tree"][path]["children"].items(), key=lambda item: -item[1])
+            if not children:
+                break
+            labels = [f"{name}  ({format_size(size)})" for name, size in children]
+            label, ok = QInputDialog.getItem(
+                self, "空间分析", f"{path}\n选择子目录继续查看：", labels, 0, False
+            )
+            if not ok:
+                break
+            name, size = children[labels.index(label)]
+            path = os.path.join(path, name)
+            self.append_to_log(f"[目录] {path}  {format_size(size)}", "Blue")
+            grandchildren = report["tree"].get(path, {}).get("children", {})
+            for child, child_size in sorted(grandchildren.items(), key=lambda item: -item[1]):
+                self.append_to_log(f"    [目录] {child}  {format_size(child_size)}", "Blue")
 
     def change_rename(self):
         """
@@ -334,6 +1858,181 @@ class FileProcessorUI(QMainWindow):
         dialog.setLayout(form_layout)
         dialog.exec_()
 
+    def show_delete_dialog(self):
+        """
+        显示批量删除文件的对话框，支持按后缀、通配符、修改时间、大小和类别筛选，先预览再删除。
+        """
+        if not self.current_path:
+            self.log_output.append("请先选择路径！")
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("删除文件")
+
+        form_layout = QFormLayout()
+        extensions_input = QLineEdit()
+        extensions_input.setPlaceholderText("多个用逗号分隔，如 log,tmp")
+        patterns_input = QLineEdit()
+        patterns_input.setPlaceholderText("多个用逗号分隔，如 *~,cache_*")
+        days_input = QLineEdit()
+        min_size_input = QLineEdit()
+        max_size_input = QLineEdit()
+        category_input = QComboBox()
+        category_input.addItems(("全部",) + FILE_CATEGORIES)
+        remove_dirs_checkbox = QCheckBox("删除清理后的空目录")
+        staging_checkbox = QCheckBox("移动到暂存目录而不是直接删除")
+        staging_input = QLineEdit(os.path.join(self.current_path, ".删除暂存"))
+
+        form_layout.addRow("后缀：", extensions_input)
+        form_layout.addRow("通配符：", patterns_input)
+        form_layout.addRow("早于天数：", days_input)
+        form_layout.addRow("最小大小(KB)：", min_size_input)
+        form_layout.addRow("最大大小(KB)：", max_size_input)
+        form_layout.addRow("类别：", category_input)
+        form_layout.addRow(remove_dirs_checkbox)
+        form_layout.addRow(staging_checkbox)
+        form_layout.addRow("暂存目录：", staging_input)
+
+        def read_filters():
+            """
+            读取对话框中的筛选条件（在界面线程调用），条件无效时返回 None。
+            """
+            def split(text):
+                return [item.strip() for item in text.split(",") if item.strip()]
+
+            try:
+                days = float(days_input.text()) if days_input.text().strip() else None
+                min_size = int(float(min_size_input.text()) * 1024) if min_size_input.text().strip() else None
+                max_size = int(float(max_size_input.text()) * 1024) if max_size_input.text().strip() else None
+            except ValueError:
+                self.append_to_log("天数和大小必须是数字！", "red")
+                return None
+
+            extensions = ["." + ext.lstrip(".") for ext in split(extensions_input.text())]
+            patterns = split(patterns_input.text())
+            categories = [category_input.currentText()] if category_input.currentIndex() > 0 else []
+            if not (extensions or patterns or categories or days is not None
+                    or min_size is not None or max_size is not None):
+                self.append_to_log("请至少设置一个筛选条件！", "red")
+                return None
+
+            staging_dir = staging_input.text().strip() if staging_checkbox.isChecked() else None
+            return {
+                "root": self.current_path, "extensions": extensions, "patterns": patterns, "days": days,
+                "min_size": min_size, "max_size": max_size, "categories": categories,
+                "staging_dir": staging_dir, "remove_empty_dirs": remove_dirs_checkbox.isChecked(),
+            }
+
+        def build_plan(filters, metrics=None):
+            """
+            按筛选条件扫描生成删除计划（不操作界面，在后台线程调用）。
+            """
+            plan = plan_delete(
+                filters["root"], filters["extensions"], filters["patterns"], filters["days"],
+                filters["min_size"], filters["max_size"], filters["categories"],
+                exclude_dir=filters["staging_dir"], metrics=metrics
+            )
+            plan["staging_dir"] = filters["staging_dir"]
+            return plan
+
+        def preview():
+            filters = read_filters()
+            if filters is not None:
+                self.start_task(lambda: build_plan(filters), show_preview)
+
+        def show_preview(plan, error):
+            if error:
+                self.append_to_log(f"扫描失败: {error}", "red")
+                return
+            tree = plan["tree"]
+            for index in plan["files"][:100]:
+                path, size = tree.path(index), tree.size[index]
+                self.append_to_log(f"将删除: {path} ({size} 字节)", "Slate Grey")
+            if len(plan["files"]) > 100:
+                self.append_to_log(f"... 其余 {len(plan['files']) - 100} 个文件未列出", "Slate Grey")
+            self.append_to_log(f"预览：匹配 {len(plan['files'])} 个文件，共 {plan['bytes']} 字节。", "blue")
+
+        def delete():
+            """
+            后台扫描生成删除计划，在界面线程确认后再到后台执行删除，扫描和删除记入同一份运行指标。
+            """
+            filters = read_filters()
+            if filters is None:
+                return
+            metrics = None
+
+            def scan():
+                nonlocal metrics
+                metrics = self.begin_metrics("删除文件")
+                return build_plan(filters, metrics)
+
+            def finish():
+                # 取消或未匹配时同样结束统计，扫描阶段的指标也会写入运行报告
+                return self.end_metrics(metrics)
+
+            def confirm(plan, error):
+                if error:
+                    if metrics:
+                        finish()
+                    self.append_to_log(f"扫描失败: {error}", "red")
+                    return
+                if not plan["files"]:
+                    finish()
+                    self.append_to_log("没有匹配的文件。", "blue")
+                    return
+
+                action = "移动到暂存目录" if plan["staging_dir"] else "永久删除"
+                reply = QMessageBox.question(
+                    dialog, "确认删除",
+                    f"将{action} {len(plan['files'])} 个文件，共 {plan['bytes']} 字节，是否继续？",
+                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+                )
+                if reply != QMessageBox.Yes:
+                    finish()
+                    return
+
+                def work():
+                    try:
+                        result = execute_delete(
+                            plan, filters["root"], staging_dir=plan["staging_dir"],
+                            remove_empty_dirs=filters["remove_empty_dirs"], metrics=metrics
+                        )
+                    finally:
+                        report_path = finish()
+                    return result, report_path
+
+                if not self.start_task(work, report):
+                    finish()
+
+            def report(outcome, error):
+                if error:
+                    self.append_to_log(f"删除失败: {error}", "red")
+                    return
+                result, report_path = outcome
+                for path, error in result["errors"]:
+                    self.append_to_log(f"删除失败: {path} 错误: {error}", "red")
+                self.append_to_log(
+                    f"删除完成！成功: {result['files']} 个文件 ({result['bytes']} 字节), "
+                    f"空目录: {result['dirs']} 个, 失败: {len(result['errors'])} 个。", "green"
+                )
+                if result["staging_dir"]:
+                    self.append_to_log(f"已移动到暂存目录: {result['staging_dir']}", "blue")
+                self.append_to_log(f"{metrics.summary()}，运行报告: {report_path}", "blue")
+                dialog.accept()
+
+            self.start_task(scan, confirm)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Cancel)
+        preview_button = button_box.addButton("预览", QDialogButtonBox.ActionRole)
+        delete_button = button_box.addButton("删除", QDialogButtonBox.AcceptRole)
+        preview_button.clicked.connect(preview)
+        delete_button.clicked.connect(delete)
+        button_box.rejected.connect(dialog.reject)
+
+        form_layout.addWidget(button_box)
+        dialog.setLayout(form_layout)
+        dialog.exec_()
+
     def create_files_from_txt(self):
         """
         根据TXT文件的缩进关系，在选定目录下创建文件夹和文件。
@@ -526,6 +2225,124 @@ class FileProcessorUI(QMainWindow):
         self.log_output.setTextCursor(cursor)
         self.log_output.ensureCursorVisible()
 
+    def append_lines_to_log(self, lines):
+        """
+        批量追加多行带颜色的文本到日志框，只滚动一次。
+        :param lines: list: (文本, 颜色) 列表
+        """
+        cursor = self.log_output.textCursor()
+        cursor.movePosition(QTextCursor.End)
+
+        for text, color in lines:
+            format = QTextCharFormat()
+            format.setForeground(QColor(color))
+            cursor.setCharFormat(format)
+            cursor.insertText(text + "\n")
+        self.log_output.setTextCursor(cursor)
+        self.log_output.ensureCursorVisible()
+
+    def flush_log_pipeline(self):
+        """
+        定时从日志管道取出一批日志行显示到日志框。
+        """
+        lines = self.log_pipeline.gui_sink.drain()
+        dropped = self.log_pipeline.gui_sink.take_dropped()
+        if dropped:
+            lines.insert(0, (f"日志过多，已省略 {dropped} 行（完整内容见 {BACKUP_LOG_FILE}）", "orange"))
+        if lines:
+            self.append_lines_to_log(lines)
+
+    def begin_metrics(self, operation):
+        """
+        创建本次操作的运行指标并在状态栏实时显示，可在执行操作的后台线程中调用。
+        """
+        metrics = OperationMetrics(operation, profile=self.profile_enabled)
+        self.active_metrics = metrics
+        return metrics
+
+    def end_metrics(self, metrics):
+        """
+        结束统计并导出运行报告（不操作界面，可在后台线程调用）。
+        :return: JSON 报告路径，导出失败时返回 None
+        """
+        metrics.finish()
+        try:
+            return metrics.export(os.path.join(os.getcwd(), METRICS_DIR))
+        except OSError as e:
+            backup_logger.warning(f"运行报告保存失败: {e}")
+            return None
+
+    def update_metrics_status(self):
+        """
+        定时把正在进行的操作的吞吐量和耗时显示到状态栏，操作结束后保留最终结果。
+        """
+        metrics = self.active_metrics
+        if metrics is None:
+            return
+        self.status_bar.showMessage(metrics.summary())
+        if metrics.finished_at:
+            self.active_metrics = None
+
+    def start_task(self, work, done):
+        """
+        在后台线程执行耗时操作，状态栏可由定时器实时刷新；完成后由定时器在界面线程调用 done。
+        :param work: 无参数的函数，在后台线程执行，不能操作界面
+        :param done: done(结果, 异常)，在界面线程调用，work 出错时结果为 None
+        :return: bool: 已有后台任务在运行时返回 False
+        """
+        if self.task_running:
+            self.append_to_log("已有任务正在运行，请等待完成！", "red")
+            return False
+
+        def run():
+            try:
+                result, error = work(), None
+            except Exception as e:
+                result, error = None, e
+            self.task_results.put((done, result, error))
+
+        # 非守护线程：退出时等待任务结束，不会在删除文件的中途被强行终止
+        self.task_running = True
+        self.task_thread = threading.Thread(target=run)
+        self.task_thread.start()
+        return True
+
+    def process_task_results(self):
+        """
+        定时在界面线程处理已完成的后台任务，done 中可以继续启动新的后台任务。
+        """
+        while True:
+            try:
+                done, result, error = self.task_results.get_nowait()
+            except queue.Empty:
+                return
+            self.task_running = False
+            done(result, error)
+
+    def closeEvent(self, event):
+        """
+        关闭窗口时停止日志管道，确保剩余日志写入文件。
+        备份或其他后台任务仍在运行时询问用户：等待任务完成后再退出，或取消关闭。
+        强行中断同步会留下写了一半的文件，其修改时间比源文件新，之后的增量同步不会再复制它。
+        """
+        if self.task_thread and self.task_thread.is_alive():
+            reply = QMessageBox.question(
+                self, "任务正在运行",
+                "备份或其他任务仍在运行，强行退出可能导致目标文件不完整。\n是否等待任务完成后退出？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+            self.status_bar.showMessage("正在等待任务完成...")
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                self.task_thread.join()
+            finally:
+                QApplication.restoreOverrideCursor()
+        self.log_pipeline.stop()
+        super().closeEvent(event)
+
     def show_backup_dialog(self):
         """
         显示文件备份窗口（非模态）。
@@ -562,10 +2379,12 @@ class FileProcessorUI(QMainWindow):
         self.incremental_backup = QRadioButton("增量同步")
         self.sync_left_to_right = QRadioButton("单向同步")
         self.sync_mirror = QRadioButton("镜像同步")
+        self.archive_backup = QRadioButton("归档备份")
         mode_layout = QVBoxLayout()
         mode_layout.addWidget(self.incremental_backup)
         mode_layout.addWidget(self.sync_left_to_right)
         mode_layout.addWidget(self.sync_mirror)
+        mode_layout.addWidget(self.archive_backup)
 
         # 备份组显示框
         self.sync_group_list_widget = QVBoxLayout()
@@ -581,16 +2400,19 @@ class FileProcessorUI(QMainWindow):
         save_button = QPushButton("保存")
         analyze_button = QPushButton("分析")
         start_button = QPushButton("开始")
+        restore_button = QPushButton("从归档还原")
         cancel_button = QPushButton("取消")
 
         save_button.clicked.connect(self.save_sync_group)
         # analyze_button.clicked.connect(self.analyze_difference)
         start_button.clicked.connect(self.start_backup)
+        restore_button.clicked.connect(self.restore_from_archive)
         cancel_button.clicked.connect(self.backup_dialog.close)
 
         button_layout.addWidget(save_button)
         button_layout.addWidget(analyze_button)
         button_layout.addWidget(start_button)
+        button_layout.addWidget(restore_button)
         button_layout.addWidget(cancel_button)
 
         # 添加到布局
@@ -645,6 +2467,8 @@ class FileProcessorUI(QMainWindow):
             self.sync_left_to_right.setChecked(True)
         elif mode == "镜像同步":
             self.sync_mirror.setChecked(True)
+        elif mode == "归档备份":
+            self.archive_backup.setChecked(True)
 
     def save_sync_group(self):
         """
@@ -654,7 +2478,8 @@ class FileProcessorUI(QMainWindow):
         target = self.right_path_input.text()
         mode = "增量同步" if self.incremental_backup.isChecked() else \
             "单向同步" if self.sync_left_to_right.isChecked() else \
-                "镜像同步" if self.sync_mirror.isChecked() else None
+                "镜像同步" if self.sync_mirror.isChecked() else \
+                    "归档备份" if self.archive_backup.isChecked() else None
 
         if not source or not target or not mode:
             self.append_to_log("请填写完整的源路径、目标路径和同步模式！", "red")
@@ -722,79 +2547,133 @@ class FileProcessorUI(QMainWindow):
             mode = "单向同步"
         elif self.sync_mirror.isChecked():
             mode = "镜像同步"
+        elif self.archive_backup.isChecked():
+            mode = "归档备份"
 
         if not mode:
             self.append_to_log("请选择一个同步选项！", "red")
             return
 
-        self.append_to_log(f"启动 {mode}...", "green")
-        self.execute_backup(source, target, mode)
+        # 在后台线程执行备份，日志通过日志管道实时刷新到日志框；与删除、空间分析等任务共用同一个运行标记，
+        # 避免备份时同时清理或分析同一目录
+        if self.start_task(lambda: self.execute_backup(source, target, mode), lambda result, error: None):
+            self.append_to_log(f"启动 {mode}...", "green")
 
     def execute_backup(self, source, target, mode):
         """
-        根据同步模式执行相应的备份任务。
+        根据同步模式执行相应的备份任务（在后台线程中运行，不直接操作界面）。
         """
+        metrics = None
         try:
+            # 开启性能分析可能失败，放在 try 中保证错误写入日志
+            metrics = self.begin_metrics(mode)
             if mode == "增量同步":
-                self.run_dirsync(source, target, action='sync', create=True, purge=False)
+                self.run_dirsync(source, target, action='sync', create=True, purge=False, metrics=metrics)
             elif mode == "单向同步":
-                self.run_dirsync(source, target, action='sync', create=True, purge=True)
+                self.run_dirsync(source, target, action='sync', create=True, purge=True, metrics=metrics)
             elif mode == "镜像同步":
                 # 镜像同步需要双向同步
-                self.run_dirsync(source, target, action='sync', create=True, purge=True)
-                self.run_dirsync(target, source, action='sync', create=True, purge=True)
+                self.run_dirsync(source, target, action='sync', create=True, purge=True, metrics=metrics)
+                self.run_dirsync(target, source, action='sync', create=True, purge=True, metrics=metrics)
+            elif mode == "归档备份":
+                self.run_archive_backup(source, target, metrics=metrics)
         except Exception as e:
-            self.append_to_log(f"执行 {mode} 任务时发生错误: {e}", "red")
+            backup_logger.error(f"执行 {mode} 任务时发生错误: {e}", extra={"color": "red"})
+        finally:
+            if metrics:
+                report_path = self.end_metrics(metrics)
+                backup_logger.info(f"{metrics.summary()}，运行报告: {report_path}", extra={"color": "blue"})
 
 
-    def run_dirsync(self, source, target, action, create=True, purge=False):
+    def run_dirsync(self, source, target, action, create=True, purge=False, metrics=None):
         """
-        执行 dirsync 同步任务，并实时将日志刷新到主窗口日志框。
+        执行 dirsync 同步任务，日志经日志管道写入日志文件并实时刷新到主窗口日志框。
         :param source: 源路径
         :param target: 目标路径
         :param action: 同步操作类型 ('sync' or 'diff')
         :param create: 是否创建目标目录
         :param purge: 是否清理多余文件
+        :param metrics: 记录运行指标的 OperationMetrics，可选
         """
-        log_file = os.path.join(os.getcwd(), "备份文件日志.txt")  # 日志保存路径
-        logging.basicConfig(
-            filename=log_file,
-            filemode='a',
-            format='%(asctime)s - %(message)s',
-            level=logging.INFO
-        )
-
+        metrics = metrics or OperationMetrics("同步")
         try:
             start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.append_to_log(f"同步开始时间: {start_time}", "blue")
-
-            # 捕获 dirsync 的日志
-            log_output = StringIO()
-            handler = logging.StreamHandler(log_output)
-            logging.getLogger('dirsync').addHandler(handler)
-
-            # 执行同步
-            dirsync.sync(source, target, action=action, create=create, purge=purge, verbose=True)
+            backup_logger.info(f"同步开始时间: {start_time}", extra={"color": "blue"})
 
-            # 实时输出日志
-            log_output.seek(0)
-            for line in log_output:
-                self.append_to_log(line.strip(), "blue")
+            # 执行同步，dirsync 的日志由 'dirsync' 日志器进入日志管道；
+            # 与 dirsync.sync 相同的流程，但使用 InstrumentedSyncer 分阶段统计耗时和复制字节数
+            copier = InstrumentedSyncer(
+                source, target, action, metrics=metrics, create=create, purge=purge, verbose=True
+            )
+            copier.do_work()
+            copier.report()
 
             end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.append_to_log(f"同步完成时间: {end_time}", "green")
-            self.append_to_log("同步任务成功完成。", "green")
+            backup_logger.info(f"同步完成时间: {end_time}", extra={"color": "green"})
+            backup_logger.info("同步任务成功完成。", extra={"color": "green"})
 
         except Exception as e:
-            self.append_to_log(f"同步过程中发生异常: {str(e)}", "red")
-        finally:
-            # 保存日志到文件
-            log_output.seek(0)
-            with open(log_file, "a", encoding="utf-8") as file:
-                file.write(log_output.read())
+            backup_logger.error(f"同步过程中发生异常: {str(e)}", extra={"color": "red"})
 
-            # 移除 handler 防止重复输出
-            logging.getLogger('dirsync').removeHandler(handler)
+    def run_archive_backup(self, source, target, metrics=None):
+        """
+        执行归档备份：只把相对上一次归档有变化的文件写入分块压缩的 tar 归档。
+        :param source: 源路径
+        :param target: 归档保存目录
+        :param metrics: 记录运行指标的 OperationMetrics，可选
+        """
+        start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        backup_logger.info(f"归档开始时间: {start_time}", extra={"color": "blue"})
+
+        archive_path, index = create_archive_backup(source, target, metrics=metrics)
+        if zstandard is None:
+            backup_logger.warning("未安装 zstandard 模块，已使用 xz 压缩。", extra={"color": "orange"})
+        for arcname, error in index["skipped"]:
+            backup_logger.warning(f"跳过无法读取的文件 {arcname}: {error}", extra={"color": "orange"})
+
+        raw_bytes = index["raw_bytes"]
+        compressed_bytes = index["compressed_bytes"]
+        ratio = compressed_bytes / raw_bytes * 100 if raw_bytes else 0
+        backup_logger.info(f"归档文件: {archive_path}", extra={"color": "blue"})
+        backup_logger.info(
+            f"归档 {len(index['files'])} 个文件，删除记录 {len(index['deleted'])} 个，跳过 {len(index['skipped'])} 个，"
+            f"原始 {raw_bytes} 字节，压缩后 {compressed_bytes} 字节 ({ratio:.1f}%)", extra={"color": "blue"}
+        )
+
+        end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        backup_logger.info(f"归档完成时间: {end_time}", extra={"color": "green"})
+
+    def restore_from_archive(self):
+        """
+        从归档中还原单个文件，只解压该文件所在的压缩块。
+        """
+        archive_path, _ = QFileDialog.getOpenFileName(
+            self, "选择归档文件", "", "归档文件 (*.tar.zst *.tar.xz)"
+        )
+        if not archive_path:
+            return
+
+        try:
+            index = load_archive_index(archive_path)
+        except (OSError, json.JSONDecodeError) as e:
+            self.append_to_log(f"读取归档索引失败: {e}", "red")
+            return
+
+        member, ok = QInputDialog.getItem(
+            self, "从归档还原", "请选择要还原的文件：", sorted(index["known"]), 0, True
+        )
+        if not ok or not member:
+            return
+
+        dest_dir = QFileDialog.getExistingDirectory(self, "选择还原目录")
+        if not dest_dir:
+            return
+
+        try:
+            restored_path = restore_archive_member(archive_path, member, dest_dir)
+            self.append_to_log(f"已还原: {restored_path}", "green")
+        except Exception as e:
+            self.append_to_log(f"还原失败: {member} 错误: {e}", "red")
 
 
 